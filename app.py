@@ -6,6 +6,9 @@ import numpy as np
 import os
 from werkzeug.utils import secure_filename
 import io
+import hashlib
+import threading
+from prediction_log import PredictionLog, PREDICTION_LOG_DB, exit_on_sigterm
 
 app = Flask(__name__)
 CORS(app)
@@ -57,6 +60,30 @@ except Exception as e:
     print(f"Warning: {e}")
     model_loaded = False
 
+def get_model_version():
+    """Short content hash of the model bundle, stable across deploys"""
+    with open(MODEL_FILE, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+# Model version recorded with each logged prediction
+model_version = get_model_version() if model_loaded else None
+
+# Write-behind prediction log, flushed to SQLite in the background. It is
+# created on first use so only the process serving requests owns a writer
+# (the debug reloader's parent process imports this module too).
+prediction_log = None
+prediction_log_lock = threading.Lock()
+
+def get_prediction_log():
+    global prediction_log
+    with prediction_log_lock:
+        if prediction_log is None:
+            prediction_log = PredictionLog(PREDICTION_LOG_DB)
+    return prediction_log
+
+# `docker stop` sends SIGTERM; exit cleanly so the prediction log is flushed
+exit_on_sigterm()
+
 @app.route('/')
 def index():
     """Serve the HTML interface"""
@@ -112,6 +139,11 @@ def predict():
         segment = clv_segment(prediction)
         segment_color = get_segment_color(segment)
 
+        get_prediction_log().log(
+            {'recency': recency, 'frequency': frequency},
+            prediction, segment, model_version
+        )
+
         return jsonify({
             'clv_prediction': float(prediction),
             'segment': segment,
@@ -134,10 +166,15 @@ def predict():
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
+    log = get_prediction_log()
     return jsonify({
         'status': 'ok',
         'model_loaded': model_loaded,
-        'features': features if model_loaded else None
+        'features': features if model_loaded else None,
+        'prediction_log': {
+            'written': log.written,
+            'dropped': log.dropped
+        }
     })
 
 @app.route('/batch-predict', methods=['POST'])
@@ -207,6 +244,12 @@ def batch_predict():
                 }
             })
 
+        # Log the whole batch at once so backpressure waits at most once
+        get_prediction_log().log_many(
+            [(r['input'], r['clv_prediction'], r['segment']) for r in results],
+            model_version
+        )
+
         return jsonify({
             'results': results,
             'count': len(results)
@@ -277,6 +320,17 @@ def batch_upload():
             results_df['CLV_Prediction'] = predictions
             results_df['Segment'] = results_df['CLV_Prediction'].apply(clv_segment)
 
+            get_prediction_log().log_many(
+                [
+                    ({'recency': float(recency), 'frequency': float(frequency)}, clv, segment)
+                    for recency, frequency, clv, segment in zip(
+                        results_df['Recency'], results_df['Frequency'],
+                        results_df['CLV_Prediction'], results_df['Segment']
+                    )
+                ],
+                model_version
+            )
+
             # Convert to JSON
             results_json = results_df.to_dict(orient='records')
 
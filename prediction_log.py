@@ -0,0 +1,235 @@
+import atexit
+import json
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+
+PREDICTION_LOG_DB = os.environ.get("PREDICTION_LOG_DB", "prediction_log.db")
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    clv_prediction REAL NOT NULL,
+    segment TEXT NOT NULL,
+    model_version TEXT
+)
+"""
+
+CREATE_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp)
+"""
+
+INSERT_SQL = """
+INSERT INTO predictions (timestamp, inputs, clv_prediction, segment, model_version)
+VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def connect(db_path):
+    """Open a SQLite connection in WAL mode and make sure the table exists"""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(CREATE_TABLE_SQL)
+    conn.execute(CREATE_INDEX_SQL)
+    conn.commit()
+    return conn
+
+
+def exit_on_sigterm():
+    """
+    Turn SIGTERM into a normal interpreter exit so atexit hooks (and with them
+    PredictionLog.close()) run when `docker stop` signals the process
+    """
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+
+class PredictionLog:
+    """
+    Append-only write-behind log of CLV predictions.
+
+    Request handlers call log() or log_many() which only append to an in-memory
+    ring buffer. A background thread drains the buffer into SQLite in one
+    transaction per batch, whenever batch_size rows are waiting or
+    flush_interval seconds pass. When the buffer is full, a call blocks for up
+    to put_timeout seconds for the writer to catch up, then drops the rows that
+    did not fit and counts them in `dropped`.
+    """
+
+    def __init__(self, db_path=PREDICTION_LOG_DB, capacity=10000, batch_size=500,
+                 flush_interval=2.0, put_timeout=0.5):
+        self.db_path = db_path
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        # Both counters are only updated while holding self._cond
+        self.dropped = 0
+        self.written = 0
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        # Serializes transactions on the shared connection
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._conn = connect(db_path)
+        self._thread = threading.Thread(
+            target=self._run, name="prediction-log-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, inputs, prediction, segment, model_version=None):
+        """Queue a single prediction; returns False if it had to be dropped"""
+        return self.log_many([(inputs, prediction, segment)], model_version) == 1
+
+    def log_many(self, entries, model_version=None):
+        """
+        Queue (inputs, prediction, segment) entries with a single backpressure
+        deadline for the whole call; returns how many were queued
+        """
+        timestamp = datetime.now(timezone.utc).isoformat()
+        rows = [
+            (timestamp, json.dumps(inputs), float(prediction), segment, model_version)
+            for inputs, prediction, segment in entries
+        ]
+        deadline = time.monotonic() + self.put_timeout
+        queued = 0
+        with self._cond:
+            for row in rows:
+                while len(self._buffer) >= self.capacity and not self._closed:
+                    # Buffer is full: wake the writer and wait for it to drain
+                    self._cond.notify_all()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed or len(self._buffer) >= self.capacity:
+                    break
+                self._buffer.append(row)
+                queued += 1
+            dropped = len(rows) - queued
+            self.dropped += dropped
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        if dropped:
+            print(f"Warning: prediction log buffer full, dropped {dropped} of "
+                  f"{len(rows)} predictions")
+        return queued
+
+    def flush(self):
+        """Write everything currently buffered to SQLite"""
+        while True:
+            with self._cond:
+                if not self._buffer:
+                    return
+                batch = [self._buffer.popleft()
+                         for _ in range(min(self.batch_size, len(self._buffer)))]
+                # Space was freed, wake producers blocked on a full buffer
+                self._cond.notify_all()
+            self._write(batch)
+
+    def close(self):
+        """Stop the writer thread and flush whatever is left in the buffer"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        atexit.unregister(self.close)
+        self._thread.join()
+        self.flush()
+        with self._write_lock:
+            self._conn.close()
+
+    def _write(self, batch):
+        with self._write_lock:
+            try:
+                with self._conn:
+                    self._conn.executemany(INSERT_SQL, batch)
+                written, dropped = len(batch), 0
+            except sqlite3.Error as e:
+                print(f"Warning: failed to write {len(batch)} predictions to log: {e}")
+                written, dropped = 0, len(batch)
+        with self._cond:
+            self.written += written
+            self.dropped += dropped
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+
+def _parse_day(value, name):
+    """Normalize a date or "YYYY-MM-DD" string, raising ValueError otherwise"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a date or 'YYYY-MM-DD' string, got {value!r}")
+
+
+def segment_day_query(start=None, end=None):
+    """
+    Build the SQL and parameters behind clv_by_segment_day().
+    start and end are optional dates (or "YYYY-MM-DD" strings), both inclusive.
+    """
+    # Compare the raw timestamp column so idx_predictions_timestamp is used
+    conditions = []
+    params = {}
+    if start is not None:
+        conditions.append("timestamp >= :start")
+        params["start"] = _parse_day(start, "start").isoformat()
+    if end is not None:
+        conditions.append("timestamp < :end")
+        params["end"] = (_parse_day(end, "end") + timedelta(days=1)).isoformat()
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    query = f"""
+        SELECT substr(timestamp, 1, 10) AS day,
+               segment,
+               COUNT(*) AS predictions,
+               AVG(clv_prediction) AS average_clv,
+               SUM(clv_prediction) AS total_clv,
+               MIN(clv_prediction) AS min_clv,
+               MAX(clv_prediction) AS max_clv
+        FROM predictions
+        {where}
+        GROUP BY day, segment
+        ORDER BY day, segment
+    """
+    return query, params
+
+
+def clv_by_segment_day(db_path=PREDICTION_LOG_DB, start=None, end=None):
+    """
+    Aggregate logged CLV predictions by segment and (UTC) day.
+    start and end are optional dates (or "YYYY-MM-DD" strings), both inclusive.
+    Raises ValueError for malformed bounds and sqlite3.OperationalError if
+    db_path does not exist.
+    """
+    query, params = segment_day_query(start, end)
+
+    # Only the read helper needs pandas; the write path is stdlib only
+    import pandas as pd
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
@@ -0,0 +1,189 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+import time
+from datetime import date
+
+import pytest
+
+from prediction_log import (
+    INSERT_SQL, PredictionLog, clv_by_segment_day, connect, segment_day_query
+)
+
+SAMPLE_ROWS = [
+    ("2024-01-01T10:00:00+00:00", "{}", 100.0, "Low Value", "v"),
+    ("2024-01-01T23:59:59+00:00", "{}", 300.0, "Low Value", "v"),
+    ("2024-01-01T12:00:00+00:00", "{}", 3000.0, "High Value", "v"),
+    ("2024-01-02T00:00:00+00:00", "{}", 500.0, "Low Value", "v"),
+    ("2024-01-03T08:00:00+00:00", "{}", 2000.0, "Medium Value", "v"),
+]
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def create_sample_db(db_path):
+    conn = connect(db_path)
+    with conn:
+        conn.executemany(INSERT_SQL, SAMPLE_ROWS)
+    return conn
+
+
+def test_full_buffer_with_stalled_writer_drops_rows(tmp_path):
+    db_path = str(tmp_path / "log.db")
+    log = PredictionLog(db_path, capacity=5, batch_size=5,
+                        flush_interval=60, put_timeout=0.2)
+    total = 20
+    # Holding the write lock stalls the writer after it takes at most one batch
+    log._write_lock.acquire()
+    stalled = True
+    try:
+        start = time.monotonic()
+        queued = log.log_many(
+            [({"recency": i, "frequency": 1}, i, "Low Value") for i in range(total)]
+        )
+        elapsed = time.monotonic() - start
+        assert queued < total
+        assert log.dropped == total - queued
+        # One deadline for the whole call, not one per row
+        assert elapsed < 1.0
+        assert log.log({"recency": 0, "frequency": 1}, 0, "Low Value") is False
+        assert log.dropped == total - queued + 1
+
+        log._write_lock.release()
+        stalled = False
+        log.close()
+        assert log.written == queued
+        assert count_rows(db_path) == queued
+    finally:
+        if stalled:
+            log._write_lock.release()
+        log.close()
+
+
+def test_close_persists_buffered_rows(tmp_path):
+    db_path = str(tmp_path / "log.db")
+    log = PredictionLog(db_path, batch_size=1000, flush_interval=60)
+    for i in range(7):
+        assert log.log({"recency": i, "frequency": 1}, i, "Low Value", "abc")
+    log.close()
+    log.close()
+    assert log.written == 7
+    assert log.dropped == 0
+    assert count_rows(db_path) == 7
+
+
+def test_rows_flushed_after_interval_below_batch_size(tmp_path):
+    db_path = str(tmp_path / "log.db")
+    log = PredictionLog(db_path, batch_size=1000, flush_interval=0.1)
+    try:
+        log.log({"recency": 1, "frequency": 1}, 10, "Low Value")
+        deadline = time.monotonic() + 2
+        while log.written < 1 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert count_rows(db_path) == 1
+    finally:
+        log.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="SIGTERM cannot be handled on Windows")
+def test_sigterm_flushes_buffered_rows(tmp_path):
+    db_path = str(tmp_path / "log.db")
+    script = textwrap.dedent("""
+        import sys, time
+        from prediction_log import PredictionLog, exit_on_sigterm
+        exit_on_sigterm()
+        log = PredictionLog(sys.argv[1], batch_size=1000, flush_interval=60)
+        for i in range(25):
+            log.log({"recency": i, "frequency": 1}, i, "Low Value")
+        print("ready", flush=True)
+        time.sleep(60)
+    """)
+    proc = subprocess.Popen(
+        [sys.executable, "-c", script, db_path],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert proc.stdout.readline().strip() == "ready"
+        proc.terminate()
+        assert proc.wait(timeout=10) == 0
+    finally:
+        proc.kill()
+        proc.stdout.close()
+    assert count_rows(db_path) == 25
+
+
+def test_segment_day_query_bounds_and_grouping(tmp_path):
+    conn = create_sample_db(str(tmp_path / "log.db"))
+    try:
+        def run(start=None, end=None):
+            query, params = segment_day_query(start, end)
+            return [row[:4] for row in conn.execute(query, params)]
+
+        assert run() == [
+            ("2024-01-01", "High Value", 1, 3000.0),
+            ("2024-01-01", "Low Value", 2, 200.0),
+            ("2024-01-02", "Low Value", 1, 500.0),
+            ("2024-01-03", "Medium Value", 1, 2000.0),
+        ]
+        assert [r[:2] for r in run("2024-01-01", "2024-01-02")] == [
+            ("2024-01-01", "High Value"),
+            ("2024-01-01", "Low Value"),
+            ("2024-01-02", "Low Value"),
+        ]
+        assert run(start=date(2024, 1, 2), end=date(2024, 1, 2)) == [
+            ("2024-01-02", "Low Value", 1, 500.0),
+        ]
+        assert [r[0] for r in run(start="2024-01-03")] == ["2024-01-03"]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("bounds", [
+    {"end": "bogus"},
+    {"end": "2024/01/02"},
+    {"start": "2024-1-5"},
+    {"start": 20240105},
+])
+def test_segment_day_query_rejects_malformed_bounds(bounds):
+    with pytest.raises(ValueError):
+        segment_day_query(**bounds)
+
+
+def test_clv_by_segment_day_bounds_and_grouping(tmp_path):
+    pytest.importorskip("pandas")
+    db_path = str(tmp_path / "log.db")
+    create_sample_db(db_path).close()
+
+    result = clv_by_segment_day(db_path)
+    assert list(zip(result["day"], result["segment"], result["predictions"])) == [
+        ("2024-01-01", "High Value", 1),
+        ("2024-01-01", "Low Value", 2),
+        ("2024-01-02", "Low Value", 1),
+        ("2024-01-03", "Medium Value", 1),
+    ]
+    low = result[(result["day"] == "2024-01-01") & (result["segment"] == "Low Value")]
+    assert low["average_clv"].iloc[0] == 200.0
+    assert low["total_clv"].iloc[0] == 400.0
+
+    bounded = clv_by_segment_day(db_path, start="2024-01-01", end="2024-01-02")
+    assert set(bounded["day"]) == {"2024-01-01", "2024-01-02"}
+    assert bounded["predictions"].sum() == 4
+
+    assert clv_by_segment_day(db_path, start="2024-01-03")["predictions"].sum() == 1
+
+
+def test_clv_by_segment_day_missing_file_raises(tmp_path):
+    pytest.importorskip("pandas")
+    db_path = tmp_path / "missing.db"
+    with pytest.raises(sqlite3.OperationalError):
+        clv_by_segment_day(str(db_path))
+    assert not db_path.exists()